@@ -11,53 +11,99 @@ from ui.impact_analysis_ui import render_impact_analysis_tab
 from utils.session_utils import initialize_session_state
 from tabs.environment_compare import render_environment_compare_tab
 
-# Set page config
-st.set_page_config(
-    page_title="AWS DB ERD – Full Schema",
-    layout="wide",
-    page_icon="☁️"
-)
-
-st.title("📘 AWS Database ERD – Full Schema")
-st.caption("Connect to your AWS RDS/Aurora MySQL, inspect metadata, and render a rich ERD with PK/FK, datatypes, nullability, indexes, and optional row counts.")
+PAGE_TITLE = "📘 AWS Database ERD – Full Schema"
+PAGE_CAPTION = "Connect to your AWS RDS/Aurora MySQL, inspect metadata, and render a rich ERD with PK/FK, datatypes, nullability, indexes, and optional row counts."
 
 
 def main():
     """Main application entry point"""
-    # Initialize session state
-    initialize_session_state()
+    # Set page config (must be the first Streamlit call of the run)
+    st.set_page_config(
+        page_title="AWS DB ERD – Full Schema",
+        layout="wide",
+        page_icon="☁️"
+    )
+    
+    # Header is re-emitted on full reruns only; in-tab interactions run as
+    # fragments and never reach this point
+    _render_page_header()
     
-    # Render sidebar components
-    render_aws_credentials_section()
-    render_connection_section()
+    # Initialize session state once per session
+    if not st.session_state.get('_init_done'):
+        initialize_session_state()
+        st.session_state['_init_done'] = True
+    
+    # Render sidebar components (fragments, so they rerun independently)
+    with st.sidebar:
+        render_aws_credentials_section()
+        render_connection_section()
     
     # Render main content
-    if not st.session_state.connected:
+    connected = st.session_state.get('connected', False)
+    if not connected:
         st.info("Please connect to AWS using the sidebar to view ERD.")
     else:
         render_main_tabs()
 
 
+def _render_page_header():
+    """Render page title and caption"""
+    st.title(PAGE_TITLE)
+    st.caption(PAGE_CAPTION)
+
+
+TAB_LABELS = (
+    "ERD Diagram",
+    "Query Runner",
+    "Environment Compare",
+    "Code Impact Analysis"
+)
+
+
+# Each tab body runs as a fragment so widget events inside a tab only rerun
+# that tab. Sidebar widgets (credentials, connection) still trigger a full
+# rerun on purpose, since they change what every tab renders.
+@st.fragment
+def _erd_fragment():
+    render_erd_tab()
+
+
+@st.fragment
+def _query_fragment():
+    render_query_tab()
+
+
+@st.fragment
+def _environment_compare_fragment():
+    render_environment_compare_tab()
+
+
+@st.fragment
+def _impact_analysis_fragment():
+    render_impact_analysis_tab()
+
+
+TAB_FRAGMENTS = {
+    "ERD Diagram": _erd_fragment,
+    "Query Runner": _query_fragment,
+    "Environment Compare": _environment_compare_fragment,
+    "Code Impact Analysis": _impact_analysis_fragment
+}
+
+
 def render_main_tabs():
-    """Render main application tabs"""
-    tab1, tab2, tab3, tab4 = st.tabs([
-        "ERD Diagram", 
-        "Query Runner", 
-        "Environment Compare", 
-        "Code Impact Analysis"
-    ])
-    
-    with tab1:
-        render_erd_tab()
-    
-    with tab2:
-        render_query_tab()
-    
-    with tab3:
-        render_environment_compare_tab()
+    """Render the selected main application view"""
+    # st.tabs executes every tab body on each rerun; a segmented control
+    # lets us run only the view that is actually on screen
+    active = st.segmented_control(
+        "View",
+        options=TAB_LABELS,
+        default=TAB_LABELS[0],
+        key="active_tab",
+        label_visibility="collapsed"
+    )
     
-    with tab4:
-        render_impact_analysis_tab()
+    TAB_FRAGMENTS[active or TAB_LABELS[0]]()
 
 
 if __name__ == "__main__":
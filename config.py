@@ -28,5 +28,17 @@ CONNECTION_CONFIG = {
     "host": "localhost",
     "port": "3307",
     "username": "autotrux",
-    "password": "autotrux-pw"
-}
\ No newline at end of file
+    "password": "autotrux-pw",
+    # Set when the database sits behind RDS Proxy, which already pools connections
+    "use_rds_proxy": False
+}
+
+# Name fragments of enum/lookup tables; these rarely get UPDATE_TIME activity
+# but are always treated as active
+ENUM_TABLE_PATTERNS = [
+    'status', 'type', 'category', 'enum', 'lookup', 'reference',
+    'config', 'setting', 'option', 'code', 'list', 'reason',
+    # specific enum tables
+    'complete_by', 'job_truck_unit', 'dispatch_order', 'attribute',
+    'transcription_field', 'entity_note', 'equipment_attribute'
+]
\ No newline at end of file
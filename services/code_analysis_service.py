@@ -25,4 +25,7 @@ def analyze_column_impact(repo_path, table_name, column_name, file_extensions):
 def find_unused_objects(repo_path, all_tables, all_columns, file_extensions):
     """DEPRECATED: Use CodeImpactAnalyzer.find_unused_objects_local instead"""
     analyzer = CodeImpactAnalyzer()
+    # The analyzer takes (schema, table[, column]) tuples; legacy callers pass dotted names
+    all_tables = {tuple(t.split('.')) if isinstance(t, str) else t for t in all_tables}
+    all_columns = {tuple(c.split('.')) if isinstance(c, str) else c for c in all_columns}
     return analyzer.find_unused_objects_local(repo_path, all_tables, all_columns, file_extensions)
\ No newline at end of file
@@ -1,17 +1,157 @@
 """Database connection and metadata service"""
 import pandas as pd
-from sqlalchemy import create_engine, text
+from sqlalchemy import bindparam, create_engine, text
+from sqlalchemy.pool import NullPool
 import subprocess
 import os
 import time
+import atexit
+import hashlib
+import weakref
+from config import CONNECTION_CONFIG
+
+POOL_SIZE = int(os.getenv("SL_POOL_SIZE", "5"))
+MAX_OVERFLOW = int(os.getenv("SL_MAX_OVERFLOW", "10"))
+SYSTEM_SCHEMAS = ('information_schema', 'performance_schema', 'mysql', 'sys')
+TABLE_INFO_COLUMNS = {
+    'UPDATE_TIME': 'last_update',
+    'CREATE_TIME': 'created',
+    'TABLE_ROWS': 'rows',
+    'DATA_LENGTH': 'data_size',
+    'INDEX_LENGTH': 'index_size'
+}
+
+# Every engine handed out by create_db_engine, so pools can be closed at exit
+_engines = weakref.WeakSet()
+
+def engine_url(connection_params):
+    """Build the SQLAlchemy URL for connection parameters"""
+    url = f"mysql+mysqlconnector://{connection_params['username']}:{connection_params['password']}@{connection_params['host']}:{connection_params['port']}"
+    if connection_params.get('database'):
+        url += f"/{connection_params['database']}"
+    return url
+
+def create_db_engine(connection_params):
+    """Create a pooled MySQL engine from connection parameters"""
+    return create_url_engine(engine_url(connection_params))
+
+def create_url_engine(url):
+    """Create a pooled MySQL engine for a SQLAlchemy URL"""
+    if CONNECTION_CONFIG.get('use_rds_proxy'):
+        # RDS Proxy multiplexes connections itself; don't pool twice
+        engine = create_engine(url, poolclass=NullPool, future=True)
+    else:
+        # pool_pre_ping replaces sockets dropped by the SSM tunnel on checkout
+        engine = create_engine(
+            url,
+            pool_size=POOL_SIZE,
+            max_overflow=MAX_OVERFLOW,
+            pool_pre_ping=True,
+            pool_recycle=3600,
+            pool_use_lifo=True,
+            future=True
+        )
+    _engines.add(engine)
+    return engine
+
+def dispose_engines(engines=None):
+    """Close the pools of the given engines (default: all created engines)"""
+    for engine in list(_engines if engines is None else engines):
+        if engine is None:
+            continue
+        try:
+            engine.dispose()
+        except Exception:
+            pass
+
+atexit.register(dispose_engines)
 
 def read_sql_df(conn, query, params=None):
     return pd.read_sql(text(query), conn, params=params or {})
 
-def load_schema_metadata(schema, connection_params):
+def iter_sql_chunks(conn, query, chunksize=1000, params=None):
+    """Yield Arrow-backed result DataFrames of at most `chunksize` rows"""
+    # The mysqlconnector dialect has no server-side cursors, so the driver
+    # buffers the full result; chunking only bounds each DataFrame build
+    # Arrow columns keep strings out of Python objects and hand off to st.dataframe as-is
+    return pd.read_sql(text(query), conn, params=params or {}, chunksize=chunksize, dtype_backend='pyarrow')
+
+def fetch_user_schemas(conn):
+    """List non-system schemas, filtered server-side"""
+    q = text(
+        "SELECT schema_name FROM information_schema.schemata "
+        "WHERE schema_name NOT IN :system_schemas ORDER BY schema_name"
+    ).bindparams(bindparam('system_schemas', expanding=True))
+    return conn.execute(q, {'system_schemas': list(SYSTEM_SCHEMAS)}).scalars().all()
+
+def columns_digest(columns):
+    """Order-independent 64-bit digest of a table's column names"""
+    return hashlib.blake2b("\0".join(sorted(columns)).encode("utf-8"), digest_size=8).digest()
+
+def table_info_frame(tables_df=None):
+    """Per-table info indexed by table name, with typed columns for session caching"""
+    if tables_df is None or tables_df.empty:
+        return pd.DataFrame(columns=list(TABLE_INFO_COLUMNS.values()))
+    info = tables_df.set_index(tables_df.columns[0]).reindex(columns=list(TABLE_INFO_COLUMNS))
+    info = info.rename(columns=TABLE_INFO_COLUMNS)
+    info.index.name = None
+    # Plain int64: narrower dtypes would overflow when sizes are summed
+    for col in ('rows', 'data_size', 'index_size'):
+        info[col] = pd.to_numeric(info[col].fillna(0)).astype('int64')
+    for col in ('last_update', 'created'):
+        info[col] = pd.to_datetime(info[col], errors='coerce')
+    return info
+
+def schema_fingerprint(schema_data):
+    """Digest of a schema's tables and their column digests, for keying derived caches"""
+    digest = hashlib.blake2b(digest_size=8)
+    columns_hash = schema_data.get('columns_hash', {})
+    for table in sorted(schema_data.get('tables', [])):
+        digest.update(table.encode("utf-8") + b"\0" + columns_hash.get(table, b"") + b"\0")
+    return digest.digest()
+
+def compare_schema_metadata(data1, data2):
+    """Diff tables and per-table columns of two loaded schemas"""
+    tables1 = set(data1.get('tables', []))
+    tables2 = set(data2.get('tables', []))
+    common = tables1 & tables2
+    columns1 = data1.get('columns', {})
+    columns2 = data2.get('columns', {})
+    hashes1 = data1.get('columns_hash', {})
+    hashes2 = data2.get('columns_hash', {})
+    
+    col_diffs = []
+    for table in common:
+        # Identical column lists have identical digests; skip the set work
+        digest = hashes1.get(table)
+        if digest is not None and digest == hashes2.get(table):
+            continue
+        cols1 = frozenset(columns1.get(table, ()))
+        cols2 = frozenset(columns2.get(table, ()))
+        changed = cols1 ^ cols2
+        if not changed:
+            continue
+        col_diffs.append((table, sorted(changed & cols1), sorted(changed & cols2), len(cols1) - len(changed & cols1)))
+    # Only tables with differences are displayed, so only those need ordering
+    col_diffs.sort()
+    
+    return {
+        'count1': len(tables1),
+        'count2': len(tables2),
+        'only_in_1': sorted(tables1 - tables2),
+        'only_in_2': sorted(tables2 - tables1),
+        'common': len(common),
+        'col_diffs': col_diffs
+    }
+
+def load_schema_metadata(schema, connection_params, engine=None):
     """Load metadata for a single schema quickly"""
+    # The queries name the schema explicitly, so any server-level engine
+    # works; callers pass their shared pooled one
+    owned = engine is None
+    if owned:
+        engine = create_db_engine(connection_params)
     try:
-        engine = create_engine(f"mysql+mysqlconnector://{connection_params['username']}:{connection_params['password']}@{connection_params['host']}:{connection_params['port']}/{schema}")
         with engine.connect() as conn:
             tables_query = f"""
             SELECT 
@@ -39,7 +179,7 @@ def load_schema_metadata(schema, connection_params):
                 """
                 columns_df = read_sql_df(conn, columns_query)
                 
-                schema_data = {'tables': tables, 'columns': {}, 'table_info': {}}
+                schema_data = {'tables': tables, 'columns': {}, 'columns_hash': {}, 'table_info': table_info_frame(tables_df)}
                 
                 if not columns_df.empty:
                     table_col_name = columns_df.columns[0]
@@ -47,31 +187,23 @@ def load_schema_metadata(schema, connection_params):
                     for table in tables:
                         table_cols = columns_df[columns_df[table_col_name] == table][column_col_name].tolist()
                         schema_data['columns'][table] = table_cols
-                
-                for _, row in tables_df.iterrows():
-                    table = row[table_col]
-                    schema_data['table_info'][table] = {
-                        'last_update': row.get('UPDATE_TIME'),
-                        'created': row.get('CREATE_TIME'),
-                        'rows': row.get('TABLE_ROWS', 0) or 0,
-                        'data_size': row.get('DATA_LENGTH', 0) or 0,
-                        'index_size': row.get('INDEX_LENGTH', 0) or 0
-                    }
+                        schema_data['columns_hash'][table] = columns_digest(table_cols)
                 
                 return schema_data
             else:
                 try:
-                    tables_df = read_sql_df(conn, "SHOW TABLES")
-                    if not tables_df.empty:
-                        table_col = tables_df.columns[0]
-                        tables = tables_df[table_col].tolist()
-                        return {'tables': tables, 'columns': {}, 'table_info': {}}
+                    tables = conn.execute(text(f"SHOW TABLES FROM `{schema}`")).scalars().all()
+                    if tables:
+                        return {'tables': tables, 'columns': {}, 'table_info': table_info_frame()}
                 except Exception:
                     pass
-                return {'tables': [], 'columns': {}, 'table_info': {}}
+                return {'tables': [], 'columns': {}, 'table_info': table_info_frame()}
                 
     except Exception:
-        return {'tables': [], 'columns': {}, 'table_info': {}}
+        return {'tables': [], 'columns': {}, 'table_info': table_info_frame()}
+    finally:
+        if owned:
+            engine.dispose()
 
 def execute_reconnect_scripts(environment, environments_config, aws_creds=None):
     """Execute AWS SSM session for selected environment"""
@@ -1,10 +1,36 @@
 """ERD generation service"""
 import pandas as pd
 import graphviz
+from concurrent.futures import ThreadPoolExecutor
 from sqlalchemy import create_engine
 from .database_service import read_sql_df
 
+# Canonical (lower-case) column names per metadata kind. MySQL 8 returns
+# information_schema columns upper-cased, so names are normalized once here.
+CANONICAL_COLUMNS = {
+    'cols': frozenset(['schema', 'table_name', 'column_name', 'data_type', 'is_nullable',
+                       'char_len', 'num_precision', 'num_scale', 'column_default']),
+    'pks': frozenset(['schema', 'table_name', 'column_name', 'ordinal_position']),
+    'fks': frozenset(['child_schema', 'child_table', 'child_column', 'parent_schema',
+                      'parent_table', 'parent_column', 'constraint_name']),
+    'idx': frozenset(['schema', 'table_name', 'index_name', 'index_columns', 'non_unique']),
+    'ti': frozenset(['schema', 'table_name', 'last_update', 'created', 'rows',
+                     'data_size', 'index_size'])
+}
+
+def _canonicalize(df, kind):
+    """Rename fetched columns to their canonical names for the metadata kind"""
+    expected = CANONICAL_COLUMNS[kind]
+    return df.rename(columns={col: col.lower() for col in df.columns if col.lower() in expected})
+
+def _schema_filter(column, schemas):
+    """Build a `column IN (...)` clause with one bind parameter per schema"""
+    names = [f"schema_{i}" for i in range(len(schemas))]
+    clause = f"{column} in ({', '.join(':' + name for name in names)})"
+    return clause, dict(zip(names, schemas))
+
 def fetch_columns(conn, engine_type, schemas):
+    schema_clause, params = _schema_filter("table_schema", schemas)
     q = """
     select table_schema as `schema`,
            table_name,
@@ -16,12 +42,13 @@ def fetch_columns(conn, engine_type, schemas):
            coalesce(numeric_scale,'') as num_scale,
            column_default
     from information_schema.columns
-    where table_schema = database()
-    order by table_name, ordinal_position
+    where {schema_clause}
+    order by table_schema, table_name, ordinal_position
     """
-    return read_sql_df(conn, q)
+    return _canonicalize(read_sql_df(conn, q.format(schema_clause=schema_clause), params), 'cols')
 
 def fetch_primary_keys(conn, engine_type, schemas):
+    schema_clause, params = _schema_filter("k.table_schema", schemas)
     q = """
     select k.table_schema as `schema`, k.table_name, k.column_name, k.ordinal_position
     from information_schema.table_constraints t
@@ -29,12 +56,13 @@ def fetch_primary_keys(conn, engine_type, schemas):
       on t.constraint_name = k.constraint_name
      and t.table_schema = k.table_schema
     where t.constraint_type = 'PRIMARY KEY'
-      and k.table_schema = database()
-    order by k.table_name, k.ordinal_position
+      and {schema_clause}
+    order by k.table_schema, k.table_name, k.ordinal_position
     """
-    return read_sql_df(conn, q)
+    return _canonicalize(read_sql_df(conn, q.format(schema_clause=schema_clause), params), 'pks')
 
 def fetch_foreign_keys(conn, engine_type, schemas):
+    schema_clause, params = _schema_filter("k.table_schema", schemas)
     q = """
     select
       k.table_schema as child_schema,
@@ -46,12 +74,13 @@ def fetch_foreign_keys(conn, engine_type, schemas):
       k.constraint_name
     from information_schema.key_column_usage k
     where k.referenced_table_name is not null
-      and k.table_schema = database()
-    order by child_table
+      and {schema_clause}
+    order by child_schema, child_table
     """
-    return read_sql_df(conn, q)
+    return _canonicalize(read_sql_df(conn, q.format(schema_clause=schema_clause), params), 'fks')
 
 def fetch_indexes(conn, engine_type, schemas):
+    schema_clause, params = _schema_filter("table_schema", schemas)
     q = """
     select table_schema as `schema`,
            table_name,
@@ -59,24 +88,62 @@ def fetch_indexes(conn, engine_type, schemas):
            group_concat(column_name order by seq_in_index) as index_columns,
            min(non_unique) as non_unique
     from information_schema.statistics
-    where table_schema = database()
+    where {schema_clause}
     group by table_schema, table_name, index_name
-    order by table_name, index_name
+    order by table_schema, table_name, index_name
     """
-    return read_sql_df(conn, q)
+    return _canonicalize(read_sql_df(conn, q.format(schema_clause=schema_clause), params), 'idx')
 
-def fetch_row_counts(conn, engine_type, schemas, include_row_counts):
-    if not include_row_counts:
-        return pd.DataFrame(columns=["schema","table_name","row_count"])
+def fetch_table_info(conn, engine_type, schemas):
+    schema_clause, params = _schema_filter("table_schema", schemas)
     q = """
     select table_schema as `schema`,
            table_name,
-           table_rows as row_count
+           update_time as last_update,
+           create_time as created,
+           table_rows as `rows`,
+           data_length as data_size,
+           index_length as index_size
     from information_schema.tables
-    where table_schema = database()
+    where {schema_clause}
       and table_type = 'BASE TABLE'
+    order by table_schema, table_name
     """
-    return read_sql_df(conn, q)
+    return _canonicalize(read_sql_df(conn, q.format(schema_clause=schema_clause), params), 'ti')
+
+def _row_counts(table_info, include_row_counts):
+    """Row count estimates (TABLE_ROWS) taken from already fetched table info"""
+    if not include_row_counts:
+        return pd.DataFrame(columns=["schema", "table_name", "row_count"])
+    return table_info[['schema', 'table_name', 'rows']].rename(columns={'rows': 'row_count'})
+
+def fetch_row_counts(conn, engine_type, schemas, include_row_counts):
+    table_info = fetch_table_info(conn, engine_type, schemas) if include_row_counts else None
+    return _row_counts(table_info, include_row_counts)
+
+def fetch_erd_metadata(engine, engine_type, schemas, include_row_counts):
+    """Fetch columns, keys, indexes and table info for the schemas concurrently"""
+    def fetch(fetcher, *args):
+        # Each worker checks out its own pooled connection
+        with engine.connect() as conn:
+            return fetcher(conn, engine_type, schemas, *args)
+    
+    # information_schema is filtered by `table_schema IN (...)`, so every
+    # schema comes back in one round-trip per metadata kind; the five kinds
+    # are independent and run concurrently
+    with ThreadPoolExecutor(max_workers=5) as executor:
+        futures = {
+            'cols': executor.submit(fetch, fetch_columns),
+            'pks': executor.submit(fetch, fetch_primary_keys),
+            'fks': executor.submit(fetch, fetch_foreign_keys),
+            'idx': executor.submit(fetch, fetch_indexes),
+            'ti': executor.submit(fetch, fetch_table_info)
+        }
+        data = {kind: future.result() for kind, future in futures.items()}
+    
+    # Row count estimates are TABLE_ROWS, already part of the table info
+    data['rc'] = _row_counts(data['ti'], include_row_counts)
+    return data
 
 def html_escape(s: str) -> str:
     return (s or "").replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
@@ -84,53 +151,44 @@ def html_escape(s: str) -> str:
 def build_graph(schema_tables, columns, pks, fks, indexes, rowcounts, cluster_by_schema=True, show_schema_prefix=True, max_cols=80):
     dot = graphviz.Digraph(graph_attr={"rankdir": "LR", "fontsize": "10"})
 
-    # Fast lookups with dynamic column names
+    # Fast lookups (frames use the canonical column names from fetch_*)
     pk_set = set()
     if not pks.empty:
-        pk_schema_col = next((col for col in pks.columns if 'schema' in col.lower()), 'schema')
-        pk_table_col = next((col for col in pks.columns if 'table' in col.lower()), 'table_name')
-        pk_column_col = next((col for col in pks.columns if 'column' in col.lower()), 'column_name')
-        pk_set = {(r[pk_schema_col], r[pk_table_col], r[pk_column_col]) for _, r in pks.iterrows()}
+        pk_set = set(zip(pks['schema'], pks['table_name'], pks['column_name']))
     
     fk_cols_map = {}
     if not fks.empty:
-        fk_child_schema_col = next((col for col in fks.columns if 'child' in col.lower() and 'schema' in col.lower()), 'child_schema')
-        fk_child_table_col = next((col for col in fks.columns if 'child' in col.lower() and 'table' in col.lower()), 'child_table')
-        fk_child_column_col = next((col for col in fks.columns if 'child' in col.lower() and 'column' in col.lower()), 'child_column')
-        fk_parent_schema_col = next((col for col in fks.columns if 'parent' in col.lower() and 'schema' in col.lower()), 'parent_schema')
-        fk_parent_table_col = next((col for col in fks.columns if 'parent' in col.lower() and 'table' in col.lower()), 'parent_table')
-        fk_parent_column_col = next((col for col in fks.columns if 'parent' in col.lower() and 'column' in col.lower()), 'parent_column')
-        fk_cols_map = {(r[fk_child_schema_col], r[fk_child_table_col], r[fk_child_column_col]): (r[fk_parent_schema_col], r[fk_parent_table_col], r[fk_parent_column_col]) for _, r in fks.iterrows()}
+        fk_cols_map = dict(zip(
+            zip(fks['child_schema'], fks['child_table'], fks['child_column']),
+            zip(fks['parent_schema'], fks['parent_table'], fks['parent_column'])
+        ))
 
     # Index map per table
     idx_map = {}
     if not indexes.empty:
-        idx_schema_col = next((col for col in indexes.columns if 'schema' in col.lower()), 'schema')
-        idx_table_col = next((col for col in indexes.columns if 'table' in col.lower()), 'table_name')
         for _, r in indexes.iterrows():
-            key = (r[idx_schema_col], r[idx_table_col])
+            key = (r['schema'], r['table_name'])
             idx_map.setdefault(key, []).append(r.to_dict())
 
     # Rowcount map
     rc_map = {}
     if not rowcounts.empty:
-        rc_schema_col = next((col for col in rowcounts.columns if 'schema' in col.lower()), 'schema')
-        rc_table_col = next((col for col in rowcounts.columns if 'table' in col.lower()), 'table_name')
-        rc_count_col = next((col for col in rowcounts.columns if 'count' in col.lower() or 'row' in col.lower()), 'row_count')
         for _, r in rowcounts.iterrows():
-            rc_map[(r[rc_schema_col], r[rc_table_col])] = int(r.get(rc_count_col, 0) or 0)
+            rc_map[(r['schema'], r['table_name'])] = int(r.get('row_count', 0) or 0)
+
+    # Split columns per table once instead of masking the full frame per node
+    cols_by_table = {key: group for key, group in columns.groupby(['schema', 'table_name'], observed=True, sort=False)}
+    empty_cols = columns.iloc[0:0]
 
     # Build nodes (cluster per schema)
     if cluster_by_schema:
-        for schema, group in schema_tables.groupby("schema"):
+        for schema, group in schema_tables.groupby("schema", observed=True):
             with dot.subgraph(name=f"cluster_{schema}") as c:
                 c.attr(label=schema, style="rounded", color="gray")
                 for _, t in group.iterrows():
                     schema_name = t['schema']
                     table_name = t['table_name']
-                    schema_col_name = next((col for col in columns.columns if 'schema' in col.lower()), 'schema')
-                    table_col_name = next((col for col in columns.columns if 'table' in col.lower()), 'table_name')
-                    cols_df = columns[(columns[schema_col_name] == schema_name) & (columns[table_col_name] == table_name)]
+                    cols_df = cols_by_table.get((schema_name, table_name), empty_cols)
                     idx_df = pd.DataFrame(idx_map.get((schema_name, table_name), []))
                     rowc = rc_map.get((schema_name, table_name))
                     label = build_table_label(schema_name, table_name, cols_df, pk_set, fk_cols_map, idx_df, rowc, show_schema_prefix, max_cols)
@@ -139,9 +197,7 @@ def build_graph(schema_tables, columns, pks, fks, indexes, rowcounts, cluster_by
         for _, t in schema_tables.iterrows():
             schema_name = t['schema']
             table_name = t['table_name']
-            schema_col_name = next((col for col in columns.columns if 'schema' in col.lower()), 'schema')
-            table_col_name = next((col for col in columns.columns if 'table' in col.lower()), 'table_name')
-            cols_df = columns[(columns[schema_col_name] == schema_name) & (columns[table_col_name] == table_name)]
+            cols_df = cols_by_table.get((schema_name, table_name), empty_cols)
             idx_df = pd.DataFrame(idx_map.get((schema_name, table_name), []))
             rowc = rc_map.get((schema_name, table_name))
             label = build_table_label(schema_name, table_name, cols_df, pk_set, fk_cols_map, idx_df, rowc, show_schema_prefix, max_cols)
@@ -149,16 +205,10 @@ def build_graph(schema_tables, columns, pks, fks, indexes, rowcounts, cluster_by
 
     # Edges (child -> parent)
     if not fks.empty:
-        fk_child_schema_col = next((col for col in fks.columns if 'child' in col.lower() and 'schema' in col.lower()), 'child_schema')
-        fk_child_table_col = next((col for col in fks.columns if 'child' in col.lower() and 'table' in col.lower()), 'child_table')
-        fk_child_column_col = next((col for col in fks.columns if 'child' in col.lower() and 'column' in col.lower()), 'child_column')
-        fk_parent_schema_col = next((col for col in fks.columns if 'parent' in col.lower() and 'schema' in col.lower()), 'parent_schema')
-        fk_parent_table_col = next((col for col in fks.columns if 'parent' in col.lower() and 'table' in col.lower()), 'parent_table')
-        fk_parent_column_col = next((col for col in fks.columns if 'parent' in col.lower() and 'column' in col.lower()), 'parent_column')
         for _, r in fks.iterrows():
-            child = f"{r[fk_child_schema_col]}.{r[fk_child_table_col]}"
-            parent = f"{r[fk_parent_schema_col]}.{r[fk_parent_table_col]}"
-            edge_label = f"{r[fk_child_column_col]} → {r[fk_parent_column_col]}"
+            child = f"{r['child_schema']}.{r['child_table']}"
+            parent = f"{r['parent_schema']}.{r['parent_table']}"
+            edge_label = f"{r['child_column']} → {r['parent_column']}"
             dot.edge(child, parent, label=edge_label, arrowsize="0.7")
 
     return dot
@@ -181,7 +231,6 @@ def build_table_label(schema, table, cols_df, pk_set, fk_cols_map, idx_df=None,
     )
 
 def _build_column_rows(cols_df, schema, table, pk_set, fk_cols_map, max_cols):
-    col_name_col, data_type_col, nullable_col = _get_column_names(cols_df)
     rows_html = []
     
     for displayed, (_, r) in enumerate(cols_df.iterrows()):
@@ -189,9 +238,9 @@ def _build_column_rows(cols_df, schema, table, pk_set, fk_cols_map, max_cols):
             rows_html.append(f"<tr><td align='left'><i>… {len(cols_df)-max_cols} more columns</i></td></tr>")
             break
             
-        col = r[col_name_col]
-        dtype = r[data_type_col]
-        nullable = r[nullable_col]
+        col = r['column_name']
+        dtype = r['data_type']
+        nullable = r['is_nullable']
         
         key_prefix = ""
         if (schema, table, col) in pk_set:
@@ -212,22 +261,13 @@ def _build_index_rows(idx_df):
         return []
         
     idx_html = ["<tr><td><b>Indexes</b></td></tr>"]
-    index_name_col = next((col for col in idx_df.columns if 'index' in col.lower() and 'name' in col.lower()), 'index_name')
     
     for _, r in idx_df.iterrows():
-        unique_col = next((col for col in idx_df.columns if 'unique' in col.lower()), 'non_unique')
-        columns_col = next((col for col in idx_df.columns if 'column' in col.lower()), 'index_columns')
-        unique = "UNIQUE " if (str(r.get(unique_col,"1")) == "0") else ""
-        label = f"{unique}{r[index_name_col]} ({r[columns_col]})"
+        unique = "UNIQUE " if (str(r.get('non_unique',"1")) == "0") else ""
+        label = f"{unique}{r['index_name']} ({r['index_columns']})"
         idx_html.append(f"<tr><td align='left'><font point-size='9'>{html_escape(label)}</font></td></tr>")
     return idx_html
 
-def _get_column_names(cols_df):
-    col_name_col = next((col for col in cols_df.columns if 'column' in col.lower() and 'name' in col.lower()), 'column_name')
-    data_type_col = next((col for col in cols_df.columns if 'data' in col.lower() and 'type' in col.lower()), 'data_type')
-    nullable_col = next((col for col in cols_df.columns if 'nullable' in col.lower()), 'is_nullable')
-    return col_name_col, data_type_col, nullable_col
-
 def _format_column_detail(r, dtype):
     detail = dtype
     if r.get("char_len") not in (None, "", 0, "0"):
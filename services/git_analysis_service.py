@@ -1,12 +1,99 @@
 """Git-based code impact analysis service"""
+import bisect
+import functools
+import atexit
+import itertools
+import multiprocessing
 import os
 import re
+import threading
 import time
 import requests
 import base64
 import concurrent.futures
 from datetime import datetime, timedelta, timezone
 
+try:
+    import re2  # optional linear-time engine for repository scans
+except ImportError:
+    re2 = None
+
+SCAN_WORKERS = int(os.getenv("SL_SCAN_WORKERS", str(os.cpu_count() or 1)))
+# Below this many files, pickling work to the pool costs more than the scan itself
+PARALLEL_SCAN_MIN_FILES = 64
+
+_scan_pool = None
+_scan_pool_lock = threading.Lock()
+
+
+def _get_scan_pool():
+    """Process pool for repository scans, spawned once and reused by every scan"""
+    global _scan_pool
+    with _scan_pool_lock:
+        if _scan_pool is None:
+            # Spawn rather than fork: forking the multithreaded Streamlit server
+            # can deadlock on locks held by other threads. Spawned workers pay a
+            # fresh interpreter start-up, so they are kept for the process lifetime
+            spawn = multiprocessing.get_context("spawn")
+            _scan_pool = concurrent.futures.ProcessPoolExecutor(max_workers=SCAN_WORKERS, mp_context=spawn)
+            atexit.register(_scan_pool.shutdown)
+        return _scan_pool
+
+
+def _discard_scan_pool(pool):
+    """Forget a broken scan pool so the next scan starts a fresh one"""
+    global _scan_pool
+    with _scan_pool_lock:
+        if _scan_pool is pool:
+            _scan_pool = None
+    pool.shutdown(wait=False)
+
+
+@functools.lru_cache(maxsize=16)
+def _compile_patterns(patterns):
+    """Compile a tuple of search patterns into (pattern, regex) pairs, once per process"""
+    compiled = []
+    for pattern in patterns:
+        regex = None
+        if re2 is not None:
+            try:
+                regex = re2.compile('(?i)' + pattern)
+            except Exception:
+                regex = None  # syntax RE2 doesn't support; use re
+        compiled.append((pattern, regex or re.compile(pattern, re.IGNORECASE)))
+    return tuple(compiled)
+
+
+def _find_matches(content, patterns):
+    """Find pattern matches in content string"""
+    matches = []
+    lines = line_starts = None
+    for pattern, regex in _compile_patterns(patterns):
+        for match in regex.finditer(content):
+            if lines is None:
+                # Split once per file; line numbers come from a binary
+                # search over line start offsets
+                lines = content.split('\n')
+                line_starts = [0]
+                line_starts.extend(m.end() for m in re.finditer('\n', content))
+            line_num = bisect.bisect_right(line_starts, match.start())
+            matches.append({
+                'line': line_num, 
+                'content': lines[line_num - 1].strip(), 
+                'pattern': pattern
+            })
+    return matches
+
+
+def _scan_file(file_path, patterns):
+    """Find pattern matches in a file (module-level so worker processes can run it)"""
+    try:
+        with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
+            content = f.read()
+    except Exception:
+        return []
+    return _find_matches(content, patterns)
+
 
 class GitAnalysisService:
     """Service for analyzing code repositories via Git APIs"""
@@ -262,32 +349,13 @@ class CodeImpactAnalyzer:
     
     def analyze_table_impact_local(self, repo_path, table_name, file_extensions):
         """Find all code references to a specific table in local repository"""
-        results = {'files': [], 'total_references': 0}
-        patterns = [pattern.format(table_name) for pattern in self.table_patterns]
-        
-        for root, dirs, files in os.walk(repo_path):
-            dirs[:] = self._filter_directories(dirs)
-            
-            for file in files:
-                if self._should_scan_file(file, file_extensions):
-                    file_path = os.path.join(root, file)
-                    matches = self._find_pattern_matches(file_path, patterns)
-                    
-                    if matches:
-                        rel_path = os.path.relpath(file_path, repo_path)
-                        results['files'].append({
-                            'path': rel_path,
-                            'matches': matches,
-                            'count': len(matches)
-                        })
-                        results['total_references'] += len(matches)
-        
-        return results
+        patterns = tuple(pattern.format(table_name) for pattern in self.table_patterns)
+        return self._scan_local_repo(repo_path, patterns, file_extensions)
     
     def analyze_table_impact_api(self, repo_data, table_name, file_extensions):
         """Find all code references to a specific table using API data"""
         results = {'files': [], 'total_references': 0}
-        patterns = [pattern.format(table_name) for pattern in self.table_patterns]
+        patterns = tuple(pattern.format(table_name) for pattern in self.table_patterns)
         
         for file_info in repo_data['files']:
             if self._should_scan_file(file_info['path'], file_extensions):
@@ -305,32 +373,13 @@ class CodeImpactAnalyzer:
     
     def analyze_column_impact_local(self, repo_path, table_name, column_name, file_extensions):
         """Find all code references to a specific column in local repository"""
-        results = {'files': [], 'total_references': 0}
-        patterns = self._format_column_patterns(table_name, column_name)
-        
-        for root, dirs, files in os.walk(repo_path):
-            dirs[:] = self._filter_directories(dirs)
-            
-            for file in files:
-                if self._should_scan_file(file, file_extensions):
-                    file_path = os.path.join(root, file)
-                    matches = self._find_pattern_matches(file_path, patterns)
-                    
-                    if matches:
-                        rel_path = os.path.relpath(file_path, repo_path)
-                        results['files'].append({
-                            'path': rel_path,
-                            'matches': matches,
-                            'count': len(matches)
-                        })
-                        results['total_references'] += len(matches)
-        
-        return results
+        patterns = tuple(self._format_column_patterns(table_name, column_name))
+        return self._scan_local_repo(repo_path, patterns, file_extensions)
     
     def analyze_column_impact_api(self, repo_data, table_name, column_name, file_extensions):
         """Find all code references to a specific column using API data"""
         results = {'files': [], 'total_references': 0}
-        patterns = self._format_column_patterns(table_name, column_name)
+        patterns = tuple(self._format_column_patterns(table_name, column_name))
         
         for file_info in repo_data['files']:
             if self._should_scan_file(file_info['path'], file_extensions):
@@ -370,41 +419,57 @@ class CodeImpactAnalyzer:
     
     def _find_pattern_matches(self, file_path, patterns):
         """Find pattern matches in a file"""
-        try:
-            with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                content = f.read()
-            return self._find_pattern_matches_in_content(content, patterns)
-        except Exception:
-            return []
+        return _scan_file(file_path, patterns)
     
     def _find_pattern_matches_in_content(self, content, patterns):
         """Find pattern matches in content string"""
-        matches = []
-        for pattern in patterns:
-            for match in re.finditer(pattern, content, re.IGNORECASE):
-                line_num = content[:match.start()].count('\n') + 1
-                line_content = content.split('\n')[line_num - 1].strip()
-                matches.append({
-                    'line': line_num, 
-                    'content': line_content, 
-                    'pattern': pattern
-                })
-        return matches
+        return _find_matches(content, patterns)
     
-    def _collect_all_code_content(self, repo_path, file_extensions):
-        """Collect all code content from local repository"""
-        all_code_content = ""
+    def _iter_code_files(self, repo_path, file_extensions):
+        """Yield paths of scannable files under repo_path"""
         for root, dirs, files in os.walk(repo_path):
             dirs[:] = self._filter_directories(dirs)
             
             for file in files:
                 if self._should_scan_file(file, file_extensions):
-                    file_path = os.path.join(root, file)
-                    try:
-                        with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                            all_code_content += f.read().lower() + "\n"
-                    except Exception:
-                        continue
+                    yield os.path.join(root, file)
+    
+    def _scan_local_repo(self, repo_path, patterns, file_extensions):
+        """Match every scannable file against the patterns, in parallel on large repositories"""
+        results = {'files': [], 'total_references': 0}
+        file_paths = list(self._iter_code_files(repo_path, file_extensions))
+        
+        if SCAN_WORKERS > 1 and len(file_paths) >= PARALLEL_SCAN_MIN_FILES:
+            # Regex scanning is CPU-bound; processes sidestep the GIL
+            pool = _get_scan_pool()
+            try:
+                all_matches = list(pool.map(_scan_file, file_paths, itertools.repeat(patterns), chunksize=32))
+            except concurrent.futures.BrokenExecutor:
+                _discard_scan_pool(pool)
+                all_matches = [_scan_file(file_path, patterns) for file_path in file_paths]
+        else:
+            all_matches = [_scan_file(file_path, patterns) for file_path in file_paths]
+        
+        for file_path, matches in zip(file_paths, all_matches):
+            if matches:
+                results['files'].append({
+                    'path': os.path.relpath(file_path, repo_path),
+                    'matches': matches,
+                    'count': len(matches)
+                })
+                results['total_references'] += len(matches)
+        
+        return results
+    
+    def _collect_all_code_content(self, repo_path, file_extensions):
+        """Collect all code content from local repository"""
+        all_code_content = ""
+        for file_path in self._iter_code_files(repo_path, file_extensions):
+            try:
+                with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
+                    all_code_content += f.read().lower() + "\n"
+            except Exception:
+                continue
         
         return all_code_content
     
@@ -421,22 +486,17 @@ class CodeImpactAnalyzer:
         return formatted_patterns
     
     def _identify_unused_objects(self, all_code_content, all_tables, all_columns):
-        """Identify unused database objects"""
-        unused_tables = []
-        for table in all_tables:
-            table_name = table.split('.')[-1]
-            if table_name.lower() not in all_code_content:
-                unused_tables.append(table)
-        
-        unused_columns = []
-        for column in all_columns:
-            column_name = column.split('.')[-1]
-            if column_name.lower() not in all_code_content:
-                unused_columns.append(column)
+        """Identify unused database objects from (schema, table[, column]) tuples"""
+        unused_tables = [
+            '.'.join(table) for table in all_tables
+            if table[-1].lower() not in all_code_content
+        ]
+        
+        unused_columns = [column for column in all_columns if column[-1].lower() not in all_code_content]
         
         return {
             'unused_tables': unused_tables,
-            'unused_columns': unused_columns[:100],  # Limit for performance
+            'unused_columns': ['.'.join(column) for column in unused_columns[:100]],  # Limit for performance
             'total_tables': len(all_tables),
             'total_columns': len(all_columns)
         }
\ No newline at end of file
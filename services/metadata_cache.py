@@ -0,0 +1,73 @@
+"""On-disk schema metadata cache shared across app restarts"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+CACHE_PATH = os.getenv("SL_METADATA_CACHE", os.path.join(os.path.dirname(os.path.dirname(__file__)), ".schemalens_cache.sqlite"))
+CACHE_TTL_SECONDS = int(os.getenv("SL_METADATA_CACHE_TTL", "3600"))
+# Bump when the payload layout changes; older tables are simply ignored
+CACHE_VERSION = 2
+_TABLE = f"metadata_cache_v{CACHE_VERSION}"
+
+_lock = threading.Lock()
+_conn = None
+
+def _connection():
+    global _conn
+    if _conn is None:
+        # Autocommit; one connection shared by script threads, guarded by _lock
+        _conn = sqlite3.connect(CACHE_PATH, isolation_level=None, check_same_thread=False)
+        _conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {_TABLE} ("
+            "env TEXT, schema TEXT, fetched_at REAL, payload BLOB, PRIMARY KEY (env, schema))"
+        )
+    return _conn
+
+def cache_get(env, schema, max_age=CACHE_TTL_SECONDS):
+    """Return cached metadata for (env, schema), or None if missing or stale"""
+    try:
+        with _lock:
+            row = _connection().execute(
+                f"SELECT fetched_at, payload FROM {_TABLE} WHERE env = ? AND schema = ?",
+                (env, schema)
+            ).fetchone()
+    except sqlite3.Error:
+        return None
+    if row is None or time.time() - row[0] > max_age:
+        return None
+    try:
+        return pickle.loads(row[1])
+    except Exception:
+        # Corrupt or written by incompatible library versions; reload from the database
+        _delete(env, schema)
+        return None
+
+def _delete(env, schema):
+    """Drop the cached entry for (env, schema)"""
+    try:
+        with _lock:
+            _connection().execute(f"DELETE FROM {_TABLE} WHERE env = ? AND schema = ?", (env, schema))
+    except sqlite3.Error:
+        pass
+
+def cache_put(env, schema, payload):
+    """Store metadata for (env, schema); cache write failures are not fatal"""
+    blob = pickle.dumps(payload, protocol=pickle.HIGHEST_PROTOCOL)
+    try:
+        with _lock:
+            _connection().execute(
+                f"INSERT OR REPLACE INTO {_TABLE} (env, schema, fetched_at, payload) VALUES (?, ?, ?, ?)",
+                (env, schema, time.time(), blob)
+            )
+    except sqlite3.Error:
+        pass
+
+def cache_clear():
+    """Drop every cached schema payload"""
+    try:
+        with _lock:
+            _connection().execute(f"DELETE FROM {_TABLE}")
+    except sqlite3.Error:
+        pass
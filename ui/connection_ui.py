@@ -3,15 +3,17 @@
 import streamlit as st
 import os
 import time
-from sqlalchemy import create_engine
-from services.database_service import execute_reconnect_scripts, read_sql_df
+from services.database_service import dispose_engines, fetch_user_schemas
+from utils.cache_utils import clear_metadata_caches, get_engine
 from config import ENVIRONMENTS, CONNECTION_CONFIG
+from utils.connection_utils import apply_aws_exports, establish_tunnel, forget_tunnel
 
 
+@st.fragment
 def render_aws_credentials_section():
-    """Render AWS credentials setup section"""
-    st.sidebar.header("🔧 AWS Setup")
-    with st.sidebar.expander("📋 Setup Instructions", expanded=True):
+    """Render AWS credentials setup section (rendered inside st.sidebar)"""
+    st.header("🔧 AWS Setup")
+    with st.expander("📋 Setup Instructions", expanded=not st.session_state.get('connected', False)):
         aws_credentials = st.text_area(
             "AWS Credentials",
             placeholder='export AWS_ACCESS_KEY_ID="AAAA"\nexport AWS_SECRET_ACCESS_KEY="XXXXX"\nexport AWS_SESSION_TOKEN="YYYY"',
@@ -21,21 +23,15 @@ def render_aws_credentials_section():
         
         if st.button("⚙️ Set AWS Credentials"):
             _set_aws_credentials(aws_credentials)
+        
+        st.caption("Behind RDS Proxy? Set `use_rds_proxy` in `CONNECTION_CONFIG` (config.py) to skip client-side connection pooling.")
 
 
 def _set_aws_credentials(aws_credentials):
     """Set AWS credentials from export format"""
     if aws_credentials.strip():
         try:
-            credentials_set = []
-            for line in aws_credentials.strip().split('\n'):
-                if line.strip().startswith('export '):
-                    line = line.strip()[7:]  # Remove 'export '
-                    if '=' in line:
-                        key, value = line.split('=', 1)
-                        value = value.strip('"\'')
-                        os.environ[key] = value
-                        credentials_set.append(key)
+            credentials_set = apply_aws_exports(aws_credentials)
             
             if credentials_set:
                 st.success(f"✅ AWS credentials set successfully! ({', '.join(credentials_set)})")
@@ -48,21 +44,35 @@ def _set_aws_credentials(aws_credentials):
         st.warning("⚠️ Please enter AWS credentials.")
 
 
+@st.fragment
 def render_connection_section():
-    """Render database connection section"""
-    st.sidebar.header("🔐 Connection")
-    environment = st.sidebar.selectbox("Environment", ["QA", "UAT"])
-    connect_btn = st.sidebar.button("🔗 Connect to Server", type="secondary")
+    """Render database connection section (rendered inside st.sidebar)"""
+    st.header("🔐 Connection")
+    environment = st.selectbox("Environment", ["QA", "UAT"])
+    connect_btn = st.button("🔗 Connect to Server", type="secondary")
     
     if connect_btn:
         _handle_connection(environment)
+        # Fragment reruns don't touch the main area; refresh it once connected
+        if st.session_state.connected:
+            st.rerun()
+    
+    if st.session_state.connected and st.button("🧹 Clear metadata cache"):
+        # Schemas changed on the server; force the next load to re-query
+        clear_metadata_caches()
+        st.session_state.schema_metadata = {}
+        st.session_state.pop('_table_stats', None)
+        st.session_state.pop('_table_listing', None)
+        st.success("Metadata cache cleared")
     
     return environment
 
 
 def _handle_connection(environment):
     """Handle database connection logic"""
-    st.sidebar.info("🔄 Connect button clicked...")
+    st.info("🔄 Connect button clicked...")
+    if environment != st.session_state.get('environment'):
+        _dispose_session_engines()
     st.session_state.environment = environment
     
     # Use hardcoded connection config
@@ -72,18 +82,26 @@ def _handle_connection(environment):
     username = CONNECTION_CONFIG["username"]
     password = CONNECTION_CONFIG["password"]
     
-    st.sidebar.info(f"🔗 Attempting connection to {environment} environment")
+    st.info(f"🔗 Attempting connection to {environment} environment")
     
     try:
         _establish_tunnel_and_connect(environment, host, port, username, password, db_type)
     except Exception as e:
-        st.sidebar.error(f"❌ Connection failed: {e}")
+        st.error(f"❌ Connection failed: {e}")
         st.session_state.connected = False
 
 
+def _dispose_session_engines():
+    """Release pooled connections held by the current and compared environments"""
+    params = [conn['params'] for conn in st.session_state.get('env_connections', {}).values()]
+    if st.session_state.get('connection_params'):
+        params.append(st.session_state.connection_params)
+    dispose_engines([get_engine(p) for p in params])
+
+
 def _establish_tunnel_and_connect(environment, host, port, username, password, db_type):
     """Establish tunnel and database connection"""
-    st.sidebar.info("🚇 Setting up tunnel first...")
+    st.info("🚇 Setting up tunnel first...")
     
     # Check AWS credentials
     aws_access_key = os.environ.get('AWS_ACCESS_KEY_ID')
@@ -91,11 +109,11 @@ def _establish_tunnel_and_connect(environment, host, port, username, password, d
     aws_session_token = os.environ.get('AWS_SESSION_TOKEN')
     
     if not all([aws_access_key, aws_secret_key, aws_session_token]):
-        st.sidebar.error("❌ AWS credentials not set. Please set credentials first.")
+        st.error("❌ AWS credentials not set. Please set credentials first.")
         st.stop()
     
-    st.sidebar.info(f"✅ AWS credentials found: {aws_access_key[:8]}...")
-    success, result = execute_reconnect_scripts(environment, ENVIRONMENTS)
+    st.info(f"✅ AWS credentials found: {aws_access_key[:8]}...")
+    success, result = establish_tunnel(environment)
     
     if not success:
         _handle_tunnel_failure(result, environment)
@@ -103,51 +121,48 @@ def _establish_tunnel_and_connect(environment, host, port, username, password, d
     
     local_port = result
     host = "localhost"
-    st.sidebar.info("✅ Tunnel established, connecting to database...")
+    st.info("✅ Tunnel established, connecting to database...")
     
     _test_database_connection(username, password, host, local_port, environment, db_type)
 
 
 def _handle_tunnel_failure(result, environment):
     """Handle tunnel establishment failure"""
-    st.sidebar.error(f"❌ Tunnel failed: {result}")
+    st.error(f"❌ Tunnel failed: {result}")
     if "aws: not found" in str(result) or "SessionManagerPlugin is not found" in str(result):
-        st.sidebar.warning("☁️ Streamlit Cloud doesn't support AWS SSM tunneling. Attempting direct connection...")
+        st.warning("☁️ Streamlit Cloud doesn't support AWS SSM tunneling. Attempting direct connection...")
         try:
             rds_host = ENVIRONMENTS[environment]['host']
             rds_port = 3306  # Standard MySQL port for RDS
-            st.sidebar.info(f"🔗 Attempting direct connection to {rds_host}:{rds_port}")
+            st.info(f"🔗 Attempting direct connection to {rds_host}:{rds_port}")
         except Exception as e:
-            st.sidebar.error(f"❌ Direct connection setup failed: {e}")
+            st.error(f"❌ Direct connection setup failed: {e}")
             st.stop()
     else:
-        st.sidebar.error("💡 Try running locally for full functionality.")
+        st.error("💡 Try running locally for full functionality.")
         st.stop()
 
 
 def _test_database_connection(username, password, host, local_port, environment, db_type):
     """Test database connection and fetch schemas"""
-    engine = create_engine(f"mysql+mysqlconnector://{username}:{password}@{host}:{local_port}")
+    engine = get_engine({'username': username, 'password': password, 'host': host, 'port': local_port})
     
-    st.sidebar.info("🔌 Testing database connection...")
+    st.info("🔌 Testing database connection...")
     try:
         with engine.connect() as conn:
-            st.sidebar.info("✅ Database connected, fetching schemas...")
-            q = "show databases"
-            dbs_df = read_sql_df(conn, q)
-            db_col = dbs_df.columns[0]
-            available_schemas = [db for db in dbs_df[db_col].tolist() 
-                               if db not in ('information_schema', 'performance_schema', 'mysql', 'sys')]
+            st.info("✅ Database connected, fetching schemas...")
+            available_schemas = fetch_user_schemas(conn)
             
-            _store_connection_state(engine, db_type, host, local_port, username, password, environment, available_schemas)
+            _store_connection_state(db_type, host, local_port, username, password, environment, available_schemas)
             
     except Exception as conn_error:
+        # The tunnel may be what failed; open a fresh one on the next attempt
+        forget_tunnel(environment)
         _handle_connection_error(conn_error)
 
 
-def _store_connection_state(engine, db_type, host, port, username, password, environment, available_schemas):
-    """Store connection state in session"""
-    st.session_state.engine = engine
+def _store_connection_state(db_type, host, port, username, password, environment, available_schemas):
+    """Store connection state in session (the engine itself is looked up via get_engine)"""
     st.session_state.connected = True
     st.session_state.available_schemas = available_schemas
     st.session_state.connection_params = {
@@ -158,18 +173,21 @@ def _store_connection_state(engine, db_type, host, port, username, password, env
         'password': password,
         'environment': environment
     }
-    st.sidebar.success(f"✅ Connected! Found {len(available_schemas)} schemas/databases.")
+    # Fetching the schemas just proved the connection live; the next
+    # reconnect_if_needed() can skip its SELECT 1
+    st.session_state['_last_ping_ts'] = time.time()
+    st.success(f"✅ Connected! Found {len(available_schemas)} schemas/databases.")
     
     # Initialize empty cache - load on demand
     st.session_state.schema_metadata = {}
-    st.sidebar.info("💾 Metadata cache initialized - schemas will load on demand")
+    st.info("💾 Metadata cache initialized - schemas will load on demand")
 
 
 def _handle_connection_error(conn_error):
     """Handle database connection errors"""
     if "Connection timed out" in str(conn_error) or "Can't connect" in str(conn_error):
-        st.sidebar.error("❌ Direct RDS connection failed - database not publicly accessible")
-        st.sidebar.warning("🏠 This app requires local execution with AWS CLI for database access")
-        st.sidebar.info("💡 Run locally: streamlit run aws.py")
+        st.error("❌ Direct RDS connection failed - database not publicly accessible")
+        st.warning("🏠 This app requires local execution with AWS CLI for database access")
+        st.info("💡 Run locally: streamlit run aws.py")
     else:
         raise conn_error
\ No newline at end of file
@@ -1,34 +1,54 @@
 """ERD display module for rendering ERD data and diagrams"""
 
+import functools
+import shutil
+
 import streamlit as st
 import pandas as pd
+import graphviz
+from utils.ui_utils import lazy_expander
 
 
+# Expander toggles and the zoom selector rerun only their own fragment,
+# not the schema selection and options above them in the tab
+@st.fragment
 def render_erd_data_sections(erd_data, sel_schemas):
     """Render ERD data sections (columns, keys, indexes, etc.)"""
     _render_columns_section(erd_data['cols'])
-    _render_primary_keys_section(erd_data['pks'])
-    _render_foreign_keys_section(erd_data['fks'])
+    _render_primary_keys_section(erd_data)
+    _render_foreign_keys_section(erd_data)
     _render_indexes_section(erd_data['idx'])
     
     if erd_data['include_row_counts']:
         _render_row_counts_section(erd_data['rc'])
     
-    _render_table_sizes_section(sel_schemas)
+    _render_table_sizes_section(erd_data['ti'], sel_schemas)
 
 
 def _render_columns_section(cols):
     """Render columns section"""
-    with st.expander("📄 Columns", expanded=False):
+    with lazy_expander("📄 Columns", "erd_show_columns") as show:
+        if not show:
+            return
         st.dataframe(cols, use_container_width=True)
 
 
-def _render_primary_keys_section(pks):
+def _grouped(erd_data, key, group_fn):
+    """Group an ERD frame once per generated ERD instead of on every rerun"""
+    # erd_data is replaced on each generation, so the memo can't go stale
+    memo = erd_data.setdefault('_grouped', {})
+    if key not in memo:
+        memo[key] = group_fn(erd_data[key])
+    return memo[key]
+
+
+def _render_primary_keys_section(erd_data):
     """Render primary keys section"""
-    with st.expander("🔑 Primary Keys", expanded=False):
-        if not pks.empty:
-            pk_grouped = _group_primary_keys(pks)
-            grouped_df = pd.DataFrame(pk_grouped)
+    with lazy_expander("🔑 Primary Keys", "erd_show_pks") as show:
+        if not show:
+            return
+        if not erd_data['pks'].empty:
+            grouped_df = _grouped(erd_data, 'pks', _group_primary_keys)
             st.dataframe(grouped_df, use_container_width=True)
         else:
             st.info("No primary keys found")
@@ -36,36 +56,29 @@ def _render_primary_keys_section(pks):
 
 def _group_primary_keys(pk_df):
     """Group primary keys by table to show composite keys"""
-    pk_grouped = []
-    
-    # Get column names dynamically
-    schema_col = next((col for col in pk_df.columns if 'schema' in col.lower()), 'schema')
-    table_col = next((col for col in pk_df.columns if 'table' in col.lower()), 'table_name')
-    column_col = next((col for col in pk_df.columns if 'column' in col.lower()), 'column_name')
-    ordinal_col = next((col for col in pk_df.columns if 'ordinal' in col.lower()), None)
-    
-    for (schema, table), group in pk_df.groupby([schema_col, table_col]):
-        if ordinal_col:
-            columns = group.sort_values(ordinal_col)[column_col].tolist()
-        else:
-            columns = group[column_col].tolist()
-        
-        pk_grouped.append({
-            'Schema': schema,
-            'Table': table,
-            'Primary Key Columns': ', '.join(columns),
-            'Type': 'Composite' if len(columns) > 1 else 'Single'
-        })
+    grouped = (
+        pk_df.astype({'schema': 'category', 'table_name': 'category'})
+        .sort_values('ordinal_position')
+        .groupby(['schema', 'table_name'], observed=True, sort=True)['column_name']
+        .agg(columns=', '.join, n='size')
+        .reset_index()
+    )
     
-    return pk_grouped
+    return pd.DataFrame({
+        'Schema': grouped['schema'],
+        'Table': grouped['table_name'],
+        'Primary Key Columns': grouped['columns'],
+        'Type': grouped['n'].gt(1).map({True: 'Composite', False: 'Single'})
+    })
 
 
-def _render_foreign_keys_section(fks):
+def _render_foreign_keys_section(erd_data):
     """Render foreign keys section"""
-    with st.expander("🔗 Foreign Keys", expanded=False):
-        if not fks.empty:
-            fk_grouped = _group_foreign_keys(fks)
-            grouped_fk_df = pd.DataFrame(fk_grouped)
+    with lazy_expander("🔗 Foreign Keys", "erd_show_fks") as show:
+        if not show:
+            return
+        if not erd_data['fks'].empty:
+            grouped_fk_df = _grouped(erd_data, 'fks', _group_foreign_keys)
             st.dataframe(grouped_fk_df, use_container_width=True)
         else:
             st.info("No foreign keys found")
@@ -73,31 +86,30 @@ def _render_foreign_keys_section(fks):
 
 def _group_foreign_keys(fk_df):
     """Group foreign keys by constraint name"""
-    fk_grouped = []
-    
-    constraint_col = next((col for col in fk_df.columns if 'constraint' in col.lower()), 'constraint_name')
-    child_col_col = next((col for col in fk_df.columns if 'child' in col.lower() and 'column' in col.lower()), 'child_column')
-    parent_col_col = next((col for col in fk_df.columns if 'parent' in col.lower() and 'column' in col.lower()), 'parent_column')
-    
-    for constraint, group in fk_df.groupby(constraint_col):
-        first_row = group.iloc[0]
-        child_cols = group[child_col_col].tolist() if child_col_col in group.columns else []
-        parent_cols = group[parent_col_col].tolist() if parent_col_col in group.columns else []
-        
-        fk_grouped.append({
-            'Child Table': f"{first_row.get('child_schema', '')}.{first_row.get('child_table', '')}",
-            'Child Columns': ', '.join(child_cols),
-            'Parent Table': f"{first_row.get('parent_schema', '')}.{first_row.get('parent_table', '')}",
-            'Parent Columns': ', '.join(parent_cols),
-            'Constraint': constraint
-        })
+    grouped = fk_df.groupby('constraint_name', observed=True, sort=True).agg(
+        child_schema=('child_schema', 'first'),
+        child_table=('child_table', 'first'),
+        child_columns=('child_column', ', '.join),
+        parent_schema=('parent_schema', 'first'),
+        parent_table=('parent_table', 'first'),
+        parent_columns=('parent_column', ', '.join)
+    ).reset_index()
     
-    return fk_grouped
+    # Name columns may be categories; concatenate them as plain strings
+    return pd.DataFrame({
+        'Child Table': grouped['child_schema'].astype(str) + '.' + grouped['child_table'].astype(str),
+        'Child Columns': grouped['child_columns'],
+        'Parent Table': grouped['parent_schema'].astype(str) + '.' + grouped['parent_table'].astype(str),
+        'Parent Columns': grouped['parent_columns'],
+        'Constraint': grouped['constraint_name']
+    })
 
 
 def _render_indexes_section(idx):
     """Render indexes section"""
-    with st.expander("📚 Indexes", expanded=False):
+    with lazy_expander("📚 Indexes", "erd_show_indexes") as show:
+        if not show:
+            return
         if not idx.empty:
             st.dataframe(idx, use_container_width=True)
         else:
@@ -106,17 +118,21 @@ def _render_indexes_section(idx):
 
 def _render_row_counts_section(rc):
     """Render row counts section"""
-    with st.expander("🔢 Row Count Estimates", expanded=False):
+    with lazy_expander("🔢 Row Count Estimates", "erd_show_row_counts") as show:
+        if not show:
+            return
         if not rc.empty:
             st.dataframe(rc, use_container_width=True)
         else:
             st.info("No row count data available")
 
 
-def _render_table_sizes_section(sel_schemas):
+def _render_table_sizes_section(table_info, sel_schemas):
     """Render table sizes section"""
-    with st.expander("💾 Table Sizes", expanded=False):
-        size_data = _collect_table_size_data(sel_schemas)
+    with lazy_expander("💾 Table Sizes", "erd_show_sizes") as show:
+        if not show:
+            return
+        size_data = _collect_table_size_data(table_info, sel_schemas)
         
         if size_data:
             size_df = pd.DataFrame(size_data)
@@ -128,33 +144,30 @@ def _render_table_sizes_section(sel_schemas):
             st.info("No table size data available")
 
 
-def _collect_table_size_data(sel_schemas):
-    """Collect table size data from metadata"""
+def _collect_table_size_data(table_info, sel_schemas):
+    """Collect table size data from the ERD table info"""
     size_data = []
     
-    for schema in sel_schemas:
-        cache_key = f"{st.session_state.connection_params.get('environment', 'QA')}_{schema}"
-        if cache_key in st.session_state.schema_metadata:
-            schema_data = st.session_state.schema_metadata[cache_key]
-            
-            for table, info in schema_data.get('table_info', {}).items():
-                data_size = info.get('data_size', 0) or 0
-                index_size = info.get('index_size', 0) or 0
-                total_size_mb = (data_size + index_size) / (1024**2)
-                
-                if total_size_mb > 0:  # Only show tables with size data
-                    size_data.append({
-                        'Schema': schema,
-                        'Table': table,
-                        'Data Size (MB)': f"{data_size / (1024**2):.2f}",
-                        'Index Size (MB)': f"{index_size / (1024**2):.2f}",
-                        'Total Size (MB)': f"{total_size_mb:.2f}",
-                        'Rows': f"{info.get('rows', 0) or 0:,}"
-                    })
+    for row in table_info[table_info['schema'].isin(sel_schemas)].itertuples(index=False):
+        data_size = 0 if pd.isna(row.data_size) else row.data_size
+        index_size = 0 if pd.isna(row.index_size) else row.index_size
+        rows = 0 if pd.isna(row.rows) else int(row.rows)
+        total_size_mb = (data_size + index_size) / (1024**2)
+        
+        if total_size_mb > 0:  # Only show tables with size data
+            size_data.append({
+                'Schema': row.schema,
+                'Table': row.table_name,
+                'Data Size (MB)': f"{data_size / (1024**2):.2f}",
+                'Index Size (MB)': f"{index_size / (1024**2):.2f}",
+                'Total Size (MB)': f"{total_size_mb:.2f}",
+                'Rows': f"{rows:,}"
+            })
     
     return size_data
 
 
+@st.fragment
 def render_erd_diagram(erd_data, sel_schemas):
     """Render ERD diagram with controls"""
     # Display ERD with execution time and zoom controls
@@ -168,7 +181,7 @@ def render_erd_diagram(erd_data, sel_schemas):
             st.metric("Generation Time", f"{erd_data['execution_time']:.2f}s")
     
     with col3:
-        total_size_gb = _calculate_total_size(sel_schemas)
+        total_size_gb = _calculate_total_size(erd_data['ti'], sel_schemas)
         st.metric("Total Size", f"{total_size_gb:.2f} GB")
     
     with col4:
@@ -186,34 +199,47 @@ def render_erd_diagram(erd_data, sel_schemas):
     _render_export_options(erd_data['dot'])
 
 
-def _calculate_total_size(sel_schemas):
-    """Calculate total size from cached metadata"""
-    total_size_gb = 0
-    
-    for schema in sel_schemas:
-        cache_key = f"{st.session_state.connection_params.get('environment', 'QA')}_{schema}"
-        if cache_key in st.session_state.schema_metadata:
-            schema_data = st.session_state.schema_metadata[cache_key]
-            for table, info in schema_data.get('table_info', {}).items():
-                data_size = info.get('data_size', 0) or 0
-                index_size = info.get('index_size', 0) or 0
-                total_size_gb += (data_size + index_size) / (1024**3)
-    
-    return total_size_gb
+def _calculate_total_size(table_info, sel_schemas):
+    """Calculate total size of the selected schemas from the ERD table info"""
+    selected = table_info[table_info['schema'].isin(sel_schemas)]
+    return float((selected['data_size'].fillna(0) + selected['index_size'].fillna(0)).sum()) / (1024**3)
+
+
+@functools.lru_cache(maxsize=8)
+def _zoom_css(zoom_level):
+    """Opening div that scales the diagram for a zoom level like '200%'"""
+    zoom_value = int(zoom_level.rstrip('%')) / 100
+    return f"""
+    <div style="transform: scale({zoom_value}); transform-origin: top left; width: {100/zoom_value}%; height: {100/zoom_value}%;">
+    """
 
 
 def _render_diagram_with_zoom(dot, zoom_level):
     """Render diagram with zoom styling"""
-    zoom_value = int(zoom_level.replace('%', '')) / 100
-    st.markdown(f"""
-    <div style="transform: scale({zoom_value}); transform-origin: top left; width: {100/zoom_value}%; height: {100/zoom_value}%;">
-    """, unsafe_allow_html=True)
+    if shutil.which("dot"):
+        # Lay out once on the server; reruns reuse the cached SVG
+        st.html(_zoom_css(zoom_level) + _render_svg(dot.source) + "</div>")
+        return
+    
+    st.markdown(_zoom_css(zoom_level), unsafe_allow_html=True)
     
     st.graphviz_chart(dot)
     
     st.markdown("</div>", unsafe_allow_html=True)
 
 
+@st.cache_data(show_spinner=False, max_entries=32)
+def _render_svg(dot_source):
+    """Render DOT source to SVG markup, reusing the result for unchanged graphs"""
+    return graphviz.Source(dot_source).pipe(format="svg", encoding="utf-8")
+
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def _render_png(dot_source):
+    """Render DOT source to PNG bytes, reusing the result for unchanged graphs"""
+    return graphviz.Source(dot_source).pipe(format="png")
+
+
 def _render_export_options(dot):
     """Render export options for ERD"""
     col1, col2 = st.columns(2)
@@ -227,13 +253,13 @@ def _render_export_options(dot):
         )
     
     with col2:
-        try:
-            png_bytes = dot.pipe(format="png")
+        if shutil.which("dot"):
+            # Deferred: Graphviz only runs when the user clicks the button
             st.download_button(
                 label="🖼️ Download PNG",
-                data=png_bytes,
+                data=lambda: _render_png(dot.source),
                 file_name="erd.png",
                 mime="image/png",
             )
-        except Exception:
-            st.info("PNG export requires Graphviz binaries on server.")
\ No newline at end of file
+        else:
+            st.info("PNG export requires Graphviz binaries on server.")
@@ -4,8 +4,13 @@ import streamlit as st
 import pandas as pd
 import os
 import time
-from services.database_service import load_schema_metadata
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 from services.git_analysis_service import GitAnalysisService, CodeImpactAnalyzer
+from utils.cache_utils import cached_schema_metadata
+
+METADATA_WORKERS = 8
 
 
 def render_impact_analysis_tab():
@@ -90,11 +95,15 @@ def _render_target_selection(analysis_type):
 
 def _load_schema_metadata_for_analysis(selected_schema):
     """Load schema metadata for analysis"""
-    cache_key = f"{st.session_state.connection_params.get('environment', 'QA')}_{selected_schema}"
+    environment = st.session_state.connection_params.get('environment', 'QA')
+    cache_key = f"{environment}_{selected_schema}"
     if cache_key not in st.session_state.get('schema_metadata', {}):
         with st.spinner(f"Loading {selected_schema} metadata..."):
-            schema_data = load_schema_metadata(selected_schema, st.session_state.connection_params)
-            st.session_state.schema_metadata[cache_key] = schema_data
+            schema_data = cached_schema_metadata(environment, selected_schema, st.session_state.connection_params)
+            # Empty results (often a dropped tunnel) aren't kept, so the next load retries
+            if schema_data.get('tables'):
+                st.session_state.schema_metadata[cache_key] = schema_data
+            return schema_data
     
     return st.session_state.schema_metadata[cache_key]
 
@@ -394,22 +403,30 @@ def _perform_unused_objects_analysis(analyzer, file_extensions, repo_data, repo_
 
 
 def _collect_all_database_objects():
-    """Collect all database tables and columns"""
+    """Collect all database tables and columns as (schema, table[, column]) tuples"""
     all_tables = set()
     all_columns = set()
     
+    environment = st.session_state.connection_params.get('environment', 'QA')
+    params = st.session_state.connection_params
+    schema_metadata = st.session_state.schema_metadata
+    
+    # Load uncached schemas concurrently; the DB round trips dominate
+    missing = [schema for schema in st.session_state.available_schemas
+               if f"{environment}_{schema}" not in schema_metadata]
+    if missing:
+        ctx = get_script_run_ctx()
+        with ThreadPoolExecutor(max_workers=METADATA_WORKERS, initializer=lambda: add_script_run_ctx(threading.current_thread(), ctx)) as executor:
+            loaded = executor.map(lambda schema: cached_schema_metadata(environment, schema, params), missing)
+            for schema, schema_data in zip(missing, loaded):
+                if schema_data.get('tables'):
+                    schema_metadata[f"{environment}_{schema}"] = schema_data
+    
     for schema in st.session_state.available_schemas:
-        cache_key = f"{st.session_state.connection_params.get('environment', 'QA')}_{schema}"
-        if cache_key not in st.session_state.get('schema_metadata', {}):
-            schema_data = load_schema_metadata(schema, st.session_state.connection_params)
-            st.session_state.schema_metadata[cache_key] = schema_data
-        else:
-            schema_data = st.session_state.schema_metadata[cache_key]
-        
+        schema_data = schema_metadata.get(f"{environment}_{schema}", {})
         for table in schema_data.get('tables', []):
-            all_tables.add(f"{schema}.{table}")
-            for col in schema_data.get('columns', {}).get(table, []):
-                all_columns.add(f"{schema}.{table}.{col}")
+            all_tables.add((schema, table))
+            all_columns.update((schema, table, col) for col in schema_data.get('columns', {}).get(table, []))
     
     return all_tables, all_columns
 
@@ -428,8 +445,7 @@ def _display_table_impact_results(results, table_name):
         st.subheader("📁 Affected Files")
         for file_info in results['files']:
             with st.expander(f"{file_info['path']} ({file_info['count']} references)"):
-                for match in file_info['matches']:
-                    st.code(f"Line {match['line']}: {match['content']}")
+                st.code(_format_matches(file_info['matches']))
     else:
         st.info(f"No references to table '{table_name}' found in the codebase")
 
@@ -448,12 +464,16 @@ def _display_column_impact_results(results, table_name, column_name):
         st.subheader("📁 Affected Files")
         for file_info in results['files']:
             with st.expander(f"{file_info['path']} ({file_info['count']} references)"):
-                for match in file_info['matches']:
-                    st.code(f"Line {match['line']}: {match['content']}")
+                st.code(_format_matches(file_info['matches']))
     else:
         st.info(f"No references to column '{table_name}.{column_name}' found in the codebase")
 
 
+def _format_matches(matches):
+    """Format all matches of a file as one code block body"""
+    return "\n".join(f"Line {match['line']}: {match['content']}" for match in matches)
+
+
 def _display_unused_objects_results(results):
     """Display unused objects analysis results"""
     st.subheader("🗑️ Unused Database Objects")
@@ -470,19 +490,19 @@ def _display_unused_objects_results(results):
     
     if results['unused_tables']:
         st.subheader("📋 Unused Tables")
-        unused_tables_df = pd.DataFrame(results['unused_tables'], columns=['Table'])
-        st.dataframe(unused_tables_df, use_container_width=True)
+        # Arrow-backed frames go to the browser without a pandas->Arrow conversion
+        unused_tables_df = pd.DataFrame(results['unused_tables'], columns=['Table']).convert_dtypes(dtype_backend='pyarrow')
+        st.dataframe(unused_tables_df, use_container_width=True, hide_index=True)
         
-        csv = unused_tables_df.to_csv(index=False)
         st.download_button(
-            "📥 Download Unused Tables CSV",
-            data=csv,
-            file_name="unused_tables.csv",
-            mime="text/csv"
+            "📥 Download Unused Tables (Parquet)",
+            data=unused_tables_df.to_parquet(index=False),
+            file_name="unused_tables.parquet",
+            mime="application/vnd.apache.parquet"
         )
     
     if results['unused_columns']:
         st.subheader("📋 Unused Columns (Sample)")
-        unused_columns_df = pd.DataFrame(results['unused_columns'], columns=['Column'])
-        st.dataframe(unused_columns_df, use_container_width=True)
+        unused_columns_df = pd.DataFrame(results['unused_columns'], columns=['Column']).convert_dtypes(dtype_backend='pyarrow')
+        st.dataframe(unused_columns_df, use_container_width=True, hide_index=True)
         st.caption(f"Showing first {len(results['unused_columns'])} unused columns")
\ No newline at end of file
@@ -4,8 +4,21 @@ import streamlit as st
 import pandas as pd
 import time
 import re
-from sqlalchemy import create_engine
-from services.database_service import load_schema_metadata, read_sql_df
+import functools
+import io
+import math
+import sqlparse
+from services.database_service import iter_sql_chunks, table_info_frame
+from utils.cache_utils import cached_schema_metadata, get_engine
+from utils.ui_utils import lazy_expander
+from config import ENUM_TABLE_PATTERNS
+
+QUERY_CHUNK_SIZE = 1000
+RESULT_PAGE_SIZE = 2000
+CSV_CHUNK_ROWS = 10_000
+_ENUM_RE = re.compile('|'.join(ENUM_TABLE_PATTERNS), re.IGNORECASE)
+# `table_name.` at the end of the line being typed
+_TABLE_DOT_RE = re.compile(r'\b(\w+)\.$')
 
 
 def render_query_tab():
@@ -13,13 +26,13 @@ def render_query_tab():
     st.header("📊 SQL Query Runner")
     
     # Auto-populate env_connections from current connection if needed
-    if st.session_state.connected and not st.session_state.env_connections:
-        current_env = st.session_state.connection_params.get('environment', 'QA')
-        st.session_state.env_connections[current_env] = {
-            'engine': st.session_state.engine,
-            'params': st.session_state.connection_params
+    state = st.session_state
+    if state.connected and not state.env_connections:
+        current_env = state.connection_params.get('environment', 'QA')
+        state.env_connections[current_env] = {
+            'params': state.connection_params
         }
-        st.session_state.env_schemas[current_env] = st.session_state.available_schemas
+        state.env_schemas[current_env] = state.available_schemas
     
     # Environment and schema selection
     query_env, query_schema = _render_environment_selection()
@@ -43,10 +56,11 @@ def render_query_tab():
 
 def _render_environment_selection():
     """Render environment and schema selection"""
+    state = st.session_state
     col1, col2 = st.columns([1, 2])
     
     with col1:
-        available_envs = list(st.session_state.env_connections.keys())
+        available_envs = list(state.env_connections.keys())
         if available_envs:
             query_env = st.selectbox(
                 "Environment",
@@ -59,7 +73,7 @@ def _render_environment_selection():
     
     with col2:
         if query_env:
-            env_schemas = st.session_state.env_schemas.get(query_env, [])
+            env_schemas = state.env_schemas.get(query_env, [])
             query_schema = st.selectbox(
                 "Schema",
                 options=env_schemas,
@@ -73,110 +87,139 @@ def _render_environment_selection():
 
 def _show_cache_status():
     """Show metadata cache status"""
-    if st.session_state.get('schema_metadata', {}):
-        loaded_schemas = len(st.session_state.schema_metadata)
-        total_schemas = len(st.session_state.available_schemas)
+    state = st.session_state
+    schema_metadata = state.get('schema_metadata', {})
+    if schema_metadata:
+        loaded_schemas = len(schema_metadata)
+        total_schemas = len(state.available_schemas)
         st.info(f"💾 Cache: {loaded_schemas}/{total_schemas} schemas loaded")
 
 
 def _load_schema_data(query_env, query_schema):
     """Load schema data for query interface"""
     if not (query_env and query_schema):
-        return [], {}, {}
+        return [], {}, table_info_frame()
     
     # Auto-load schema metadata if not cached
     cache_key = f"{query_env}_{query_schema}"
-    if cache_key not in st.session_state.get('schema_metadata', {}):
+    schema_metadata = st.session_state.schema_metadata
+    if cache_key not in schema_metadata:
         with st.spinner(f"Loading {query_schema} from {query_env}..."):
             start_time = time.time()
-            schema_data = load_schema_metadata(query_schema, st.session_state.env_connections[query_env]['params'])
+            schema_data = cached_schema_metadata(query_env, query_schema, st.session_state.env_connections[query_env]['params'])
             load_time = time.time() - start_time
             
-            st.session_state.schema_metadata[cache_key] = schema_data
+            # Empty results (often a dropped tunnel) aren't kept, so the next rerun retries
+            if schema_data.get('tables'):
+                schema_metadata[cache_key] = schema_data
             st.success(f"✅ {query_schema} loaded from {query_env} in {load_time:.2f}s - {len(schema_data.get('tables', []))} tables found")
-    
-    # Use cached metadata
-    schema_data = st.session_state.schema_metadata[cache_key]
+    else:
+        # Use cached metadata
+        schema_data = schema_metadata[cache_key]
     return (
         schema_data.get('tables', []),
         schema_data.get('columns', {}),
-        schema_data.get('table_info', {})
+        schema_data.get('table_info', table_info_frame())
     )
 
 
 def _render_tables_info(tables, all_columns, table_info):
     """Render available tables and columns information"""
-    with st.expander("📊 Available Tables & Columns", expanded=False):
-        active_tables, unused_tables = _categorize_tables(tables, table_info)
+    with lazy_expander("📊 Available Tables & Columns", "query_show_tables") as show:
+        active_lines, unused_lines = _table_listing(tables, all_columns, table_info) if show else ("", "")
         
         # Display active tables first
-        if active_tables:
+        if active_lines:
             st.markdown("**🟢 Active Tables:**")
-            for table in sorted(active_tables):
-                cols = all_columns.get(table, [])
-                st.write(f"**{table}**: {', '.join(sorted(cols)[:5])}{'...' if len(cols) > 5 else ''}")
+            st.markdown(active_lines)
         
         # Display unused tables with separator
-        if unused_tables:
+        if unused_lines:
             st.markdown("---")
             st.markdown("**🔴 Unused Tables:**")
-            for table in sorted(unused_tables):
-                cols = all_columns.get(table, [])
-                st.write(f"**{table}**: {', '.join(sorted(cols)[:5])}{'...' if len(cols) > 5 else ''}")
+            st.markdown(unused_lines)
     
     # Display table statistics
-    if table_info:
+    if not table_info.empty:
         _render_table_statistics(tables, table_info)
 
 
+def _table_listing(tables, all_columns, table_info):
+    """Markdown for active and unused tables, built once per schema version"""
+    # Same identity-based versioning as the table statistics below
+    version = (tables, all_columns, table_info)
+    cached = st.session_state.get('_table_listing')
+    if cached is None or any(old is not new for old, new in zip(cached[0], version)):
+        active_tables, unused_tables = _categorize_tables(tables, table_info)
+        listing = (_format_table_lines(active_tables, all_columns), _format_table_lines(unused_tables, all_columns))
+        cached = (version, listing)
+        st.session_state['_table_listing'] = cached
+    return cached[1]
+
+
+def _format_table_lines(tables, all_columns):
+    """Build one markdown block listing each table with its first columns"""
+    lines = []
+    for table in sorted(tables):
+        cols = all_columns.get(table, [])
+        lines.append(f"**{table}**: {', '.join(sorted(cols)[:5])}{'...' if len(cols) > 5 else ''}")
+    return "\n\n".join(lines)
+
+
 def _categorize_tables(tables, table_info):
     """Categorize tables into active and unused"""
-    active_tables = []
-    unused_tables = []
+    if not tables:
+        return [], []
     
-    for table in tables:
-        info = table_info.get(table, {})
-        last_update = info.get('last_update')
-        
-        # Check if table is unused (same logic as ERD filtering)
-        table_lower = table.lower()
-        is_enum_table = any(pattern in table_lower for pattern in [
-            'status', 'type', 'category', 'enum', 'lookup', 'reference', 
-            'config', 'setting', 'option', 'code', 'list', 'reason',
-            # below are added to include specific enum tables
-            'complete_by', 'job_truck_unit', 'dispatch_order', 'attribute', 'transcription_field', 'entity_note', 'equipment_attribute'
-        ])
-        
-        if is_enum_table or (last_update and not pd.isna(last_update) and 
-                           str(last_update).lower() not in ['nat', 'none', 'null', 'unknown']):
-            active_tables.append(table)
-        else:
-            unused_tables.append(table)
+    # Same logic as ERD filtering: enum tables or tables with a real UPDATE_TIME
+    names = pd.Index(tables)
+    last_update = table_info['last_update'].reindex(names)
+    update_text = last_update.astype(str).str.lower()
+    has_update = last_update.notna() & ~update_text.isin(['nat', 'none', 'null', 'unknown', ''])
+    is_active = names.str.contains(_ENUM_RE) | has_update.to_numpy()
     
-    return active_tables, unused_tables
+    return names[is_active].tolist(), names[~is_active].tolist()
 
 
 def _render_table_statistics(tables, table_info):
     """Render table statistics and usage information"""
-    with st.expander("🕒 Table Statistics & Usage", expanded=False):
-        usage_data = []
-        for table in tables:
-            info = table_info.get(table, {})
-            data_size = info.get('data_size', 0) or 0
-            index_size = info.get('index_size', 0) or 0
-            total_size = (data_size + index_size) / 1024 / 1024  # Convert to MB
-            
-            usage_data.append({
-                'Table': table,
-                'Rows': f"{info.get('rows', 0) or 0:,}",
-                'Size (MB)': f"{total_size:.2f}",
-                'Last Updated': str(info.get('last_update', 'Unknown'))[:19] if info.get('last_update') else 'Unknown',
-                'Created': str(info.get('created', 'Unknown'))[:19] if info.get('created') else 'Unknown'
-            })
+    with lazy_expander("🕒 Table Statistics & Usage", "query_show_statistics") as show:
+        if not show:
+            return
+        
+        # table_info/tables live in schema_metadata, so their identity marks the schema version;
+        # the memo holds the objects themselves so a freed id can't alias a new schema
+        cached = st.session_state.get('_table_stats')
+        if cached is None or cached[0] is not tables or cached[1] is not table_info:
+            cached = (tables, table_info, _build_table_stats(tables, table_info))
+            st.session_state['_table_stats'] = cached
+        usage_df = cached[2]
         
-        if usage_data:
-            usage_df = pd.DataFrame(usage_data)
-            st.dataframe(usage_df, use_container_width=True)
+        if not usage_df.empty:
+            st.dataframe(
+                usage_df.style.format({'Rows': '{:,}', 'Size (MB)': '{:.2f}'}),
+                use_container_width=True
+            )
+
+
+def _build_table_stats(tables, table_info):
+    """Build the per-table rows/size/timestamp statistics frame"""
+    info_df = table_info.reindex(index=tables)
+    
+    sizes = info_df[['rows', 'data_size', 'index_size']].fillna(0)
+    total_size = sizes['data_size'] + sizes['index_size']
+    return pd.DataFrame({
+        'Table': info_df.index,
+        'Rows': sizes['rows'].astype('int64').to_numpy(),
+        'Size (MB)': (total_size / 1024 / 1024).to_numpy(),  # Convert to MB
+        'Last Updated': _format_timestamps(info_df['last_update']).to_numpy(),
+        'Created': _format_timestamps(info_df['created']).to_numpy()
+    })
+
+
+def _format_timestamps(values):
+    """Format timestamps to 'YYYY-MM-DD HH:MM:SS', using 'Unknown' for missing ones"""
+    return pd.to_datetime(values, errors='coerce').dt.strftime('%Y-%m-%d %H:%M:%S').fillna('Unknown')
 
 
 def _render_query_interface(tables, all_columns, query_env, query_schema):
@@ -217,9 +260,9 @@ def _show_column_suggestions(tables, all_columns, query):
     """Show smart column suggestions based on query"""
     if tables and all_columns and query:
         # Look for table_name. pattern in query
-        table_dot_matches = re.findall(r'\b(\w+)\.$', query.split('\n')[-1])
-        if table_dot_matches:
-            suggested_table = table_dot_matches[-1]
+        match = _TABLE_DOT_RE.search(query.rsplit('\n', 1)[-1])
+        if match:
+            suggested_table = match.group(1)
             if suggested_table in all_columns:
                 cols = sorted(all_columns[suggested_table])
                 st.info(f"💡 **{suggested_table}** columns: {', '.join(cols[:10])}{'...' if len(cols) > 10 else ''}")
@@ -239,24 +282,49 @@ def _render_query_controls(query, query_env, query_schema, tables):
         _execute_query(query, query_env, query_schema, limit_results)
 
 
+@functools.lru_cache(maxsize=128)
+def _has_limit(query):
+    """Whether the first statement has a top-level LIMIT clause (ignores literals and subqueries)"""
+    statements = sqlparse.parse(query)
+    return bool(statements) and any(
+        tok.is_keyword and tok.normalized == 'LIMIT' for tok in statements[0].tokens
+    )
+
+
 def _execute_query(query, query_env, query_schema, limit_results):
     """Execute SQL query"""
     try:
-        # Add LIMIT if not present and it's a SELECT query
-        query_lower = query.lower().strip()
-        if query_lower.startswith('select') and 'limit' not in query_lower:
+        # Add LIMIT if not present and it's a SELECT query; the limit is bound,
+        # while the stored query shows it inline for the editor
+        statement, params = query, {}
+        if query.lstrip()[:6].lower() == 'select' and not _has_limit(query):
+            statement = f"{query.rstrip(';')} LIMIT :row_limit"
+            params = {'row_limit': int(limit_results)}
             query = f"{query.rstrip(';')} LIMIT {limit_results}"
         
         # Track execution time
         start_time = time.time()
         
         with st.spinner(f"Executing query on {query_env}..."):
-            # Use connection from selected environment
-            env_params = st.session_state.env_connections[query_env]['params']
-            query_engine = create_engine(f"mysql+mysqlconnector://{env_params['username']}:{env_params['password']}@{env_params['host']}:{env_params['port']}/{query_schema}")
+            # Reuse the pooled engine of the selected environment
+            query_engine = get_engine(st.session_state.env_connections[query_env]['params'])
+            preview = st.empty()
+            collected = []
             
             with query_engine.connect() as query_conn:
-                result_df = read_sql_df(query_conn, query)
+                query_conn.exec_driver_sql(f"USE `{query_schema.replace('`', '``')}`")
+                # Render the preview chunk by chunk instead of after one full DataFrame build
+                for chunk in iter_sql_chunks(query_conn, statement, QUERY_CHUNK_SIZE, params):
+                    collected.append(chunk)
+                    fetched = sum(len(part) for part in collected)
+                    if fetched - len(chunk) < RESULT_PAGE_SIZE:
+                        # Rebuild the preview only while it still fits in one page
+                        preview.dataframe(pd.concat(collected, ignore_index=True), use_container_width=True)
+                    else:
+                        preview.caption(f"Fetched {fetched:,} rows…")
+            
+            result_df = pd.concat(collected, ignore_index=True) if collected else pd.DataFrame()
+            preview.empty()
         
         end_time = time.time()
         execution_time = round(end_time - start_time, 3)
@@ -290,15 +358,35 @@ def _render_query_results():
             with col2:
                 st.metric("Execution Time", f"{result_data.get('execution_time', 0)}s")
             
-            st.dataframe(result_df, use_container_width=True)
+            _render_result_page(result_df)
             
-            # Download option
-            csv = result_df.to_csv(index=False)
+            # Download option; CSV is serialized only when clicked (callable data needs streamlit>=1.52)
             st.download_button(
                 label="📥 Download CSV",
-                data=csv,
+                data=lambda: _csv_bytes(result_df),
                 file_name=f"query_results_{result_data['schema']}.csv",
                 mime="text/csv"
             )
         else:
-            st.info("Query executed but returned no results.")
\ No newline at end of file
+            st.info("Query executed but returned no results.")
+
+
+def _csv_bytes(df):
+    """Serialize a frame to UTF-8 CSV bytes, writing CSV_CHUNK_ROWS rows at a time"""
+    buffer = io.BytesIO()
+    df.to_csv(buffer, index=False, chunksize=CSV_CHUNK_ROWS, lineterminator='\n', encoding='utf-8')
+    return buffer.getvalue()
+
+
+def _render_result_page(result_df):
+    """Show one page of the result so the browser only receives RESULT_PAGE_SIZE rows"""
+    total_rows = len(result_df)
+    if total_rows <= RESULT_PAGE_SIZE:
+        st.dataframe(result_df, use_container_width=True)
+        return
+    
+    page_count = math.ceil(total_rows / RESULT_PAGE_SIZE)
+    page = st.number_input("Page", min_value=1, max_value=page_count, value=1, key="query_result_page")
+    start = (page - 1) * RESULT_PAGE_SIZE
+    st.dataframe(result_df.iloc[start:start + RESULT_PAGE_SIZE], use_container_width=True)
+    st.caption(f"Showing rows {start + 1:,}–{min(start + RESULT_PAGE_SIZE, total_rows):,} of {total_rows:,}")
\ No newline at end of file
@@ -0,0 +1,85 @@
+"""Cross-session cache helpers"""
+
+import streamlit as st
+import pandas as pd
+from services.database_service import compare_schema_metadata, create_url_engine, engine_url, load_schema_metadata, schema_fingerprint, table_info_frame
+from services.metadata_cache import cache_clear, cache_get, cache_put
+from services.erd_service import build_graph, fetch_erd_metadata
+
+
+def _frame_fingerprint(df):
+    """Cheap content fingerprint used to key cached ERD graphs"""
+    return df.shape, int(pd.util.hash_pandas_object(df, index=False).sum())
+
+
+@st.cache_resource(show_spinner=False)
+def _engine_for_url(url):
+    """One pooled engine per database URL, shared across reruns and sessions"""
+    return create_url_engine(url)
+
+
+def get_engine(connection_params):
+    """Return the shared pooled engine for connection parameters"""
+    return _engine_for_url(engine_url(connection_params))
+
+
+class SchemaMetadataUnavailable(Exception):
+    """A schema's metadata could not be loaded; never memoized"""
+
+
+@st.cache_data(ttl=3600, max_entries=64, show_spinner=False)
+def _cached_schema_metadata(environment, schema, connection_params):
+    """Load schema metadata, shared across reruns and sessions for an hour"""
+    # environment and the connection params (host/port) make up the cache key;
+    # behind the in-memory cache, the on-disk cache survives app restarts
+    schema_data = cache_get(environment, schema)
+    if schema_data is None:
+        schema_data = load_schema_metadata(schema, connection_params, get_engine(connection_params))
+        if not schema_data.get('tables'):
+            # load_schema_metadata swallows connection errors; raising keeps a
+            # transient failure out of the shared cache, since st.cache_data
+            # doesn't memoize exceptions
+            raise SchemaMetadataUnavailable(f"No tables loaded for {schema} in {environment}")
+        cache_put(environment, schema, schema_data)
+    return schema_data
+
+
+def cached_schema_metadata(environment, schema, connection_params):
+    """Load schema metadata through the shared cache; empty (and retried next call) when unavailable"""
+    try:
+        return _cached_schema_metadata(environment, schema, connection_params)
+    except SchemaMetadataUnavailable:
+        return {'tables': [], 'columns': {}, 'table_info': table_info_frame()}
+
+
+@st.cache_data(ttl=300, show_spinner=False)
+def cached_erd_metadata(environment, schemas, include_row_counts, connection_params):
+    """Fetch ERD metadata for the schemas, reused for 5 minutes per environment"""
+    engine = get_engine(connection_params)
+    return fetch_erd_metadata(engine, connection_params['db_type'], list(schemas), include_row_counts)
+
+
+@st.cache_data(ttl=600, show_spinner=False)
+def _cached_comparison(key1, key2, _data1, _data2):
+    """Schema diff keyed on (env, schema, port, metadata fingerprint) of both sides"""
+    return compare_schema_metadata(_data1, _data2)
+
+
+def cached_schema_comparison(key1, key2, data1, data2):
+    """Compare two loaded schemas, reusing the diff until either side's metadata changes"""
+    # The metadata itself is not hashed; its fingerprint stands in for it in the key
+    return _cached_comparison(key1 + (schema_fingerprint(data1),), key2 + (schema_fingerprint(data2),), data1, data2)
+
+
+def clear_metadata_caches():
+    """Drop schema and ERD metadata from the in-memory and on-disk caches"""
+    _cached_schema_metadata.clear()
+    cached_erd_metadata.clear()
+    _cached_comparison.clear()
+    cache_clear()
+
+
+@st.cache_resource(max_entries=32, show_spinner=False, hash_funcs={pd.DataFrame: _frame_fingerprint})
+def cached_build_graph(schema_tables, columns, pks, fks, indexes, rowcounts, cluster_by_schema=True, show_schema_prefix=True, max_cols=80):
+    """Build the ERD graph, reusing the Digraph when inputs and options are unchanged"""
+    return build_graph(schema_tables, columns, pks, fks, indexes, rowcounts, cluster_by_schema, show_schema_prefix, max_cols)
\ No newline at end of file
@@ -1,9 +1,28 @@
 """Connection utility functions"""
 
 import streamlit as st
+import os
+import re
 import time
-from sqlalchemy import create_engine
-from services.database_service import execute_reconnect_scripts, read_sql_df
+from sqlalchemy import text
+from services.database_service import execute_reconnect_scripts
+from utils.cache_utils import get_engine
+from config import ENVIRONMENTS
+
+TUNNEL_TTL_SECONDS = 300
+PING_TTL_SECONDS = 30
+
+# `export KEY=value` lines; matching quotes around the value are dropped
+AWS_EXPORT_RE = re.compile(r'''^\s*export\s+(\w+)\s*=\s*(["']?)(.*?)\2\s*$''', re.MULTILINE)
+
+
+def apply_aws_exports(aws_credentials):
+    """Set environment variables from pasted `export KEY=value` lines; returns the keys set"""
+    keys = []
+    for key, _, value in AWS_EXPORT_RE.findall(aws_credentials):
+        os.environ[key] = value
+        keys.append(key)
+    return keys
 
 
 def reconnect_if_needed():
@@ -11,55 +30,67 @@ def reconnect_if_needed():
     if not st.session_state.connected or not st.session_state.connection_params:
         return False
     
+    # Skip the round-trip if the connection was verified recently; pool_pre_ping
+    # still replaces dead sockets at checkout in between
+    now = time.time()
+    if now - st.session_state.get('_last_ping_ts', 0) < PING_TTL_SECONDS:
+        return True
+    
     try:
         _test_connection()
+        st.session_state['_last_ping_ts'] = now
         return True
     except Exception:
-        st.sidebar.info("🔄 Connection lost, attempting reconnect...")
+        st.info("🔄 Connection lost, attempting reconnect...")
         try:
-            return _attempt_reconnect()
+            reconnected = _attempt_reconnect()
+            if reconnected:
+                st.session_state['_last_ping_ts'] = time.time()
+            return reconnected
         except Exception as e:
             st.session_state.connected = False
-            st.sidebar.error(f"❌ Reconnection failed: {e}")
+            st.error(f"❌ Reconnection failed: {e}")
             return False
 
 
-def _test_connection():
-    """Test current database connection"""
-    with st.session_state.engine.connect() as conn:
-        read_sql_df(conn, "SELECT 1")
+def establish_tunnel(environment, force=False, aws_creds=None):
+    """Start the SSM tunnel for an environment, reusing one started recently"""
+    # Each environment forwards its own local port, so tunnels are tracked per environment
+    tunnels = st.session_state.setdefault('tunnels', {})
+    port, started = tunnels.get(environment, (None, 0))
+    if not force and port and time.time() - started < TUNNEL_TTL_SECONDS:
+        return True, port
+    
+    success, result = execute_reconnect_scripts(environment, ENVIRONMENTS, aws_creds)
+    if success:
+        tunnels[environment] = (result, time.time())
+    return success, result
 
 
-def _create_engine(params):
-    """Create database engine from parameters"""
-    return create_engine(f"mysql+mysqlconnector://{params['username']}:{params['password']}@{params['host']}:{params['port']}")
+def forget_tunnel(environment):
+    """Stop reusing the recorded tunnel of an environment"""
+    st.session_state.get('tunnels', {}).pop(environment, None)
 
 
-def _retry_connection(engine):
-    """Retry database connection with backoff"""
-    for attempt in range(3):
-        try:
-            with engine.connect() as conn:
-                read_sql_df(conn, "SELECT 1")
-            return True
-        except Exception:
-            if attempt < 2:
-                time.sleep(2)
-                continue
-            raise
+def _test_connection():
+    """Test current database connection"""
+    with get_engine(st.session_state.connection_params).connect() as conn:
+        conn.execute(text("SELECT 1")).scalar()
 
 
 def _attempt_reconnect():
     """Attempt to reconnect to database"""
-    success, _ = execute_reconnect_scripts(st.session_state.get('environment', 'QA'))
+    # The liveness check already failed, so the cached tunnel can't be trusted
+    success, _ = establish_tunnel(st.session_state.get('environment', 'QA'), force=True)
     if not success:
         return False
     
     time.sleep(3)
-    engine = _create_engine(st.session_state.connection_params)
+    # Drop sockets from the dead tunnel; pool_pre_ping validates the new checkout
+    engine = get_engine(st.session_state.connection_params)
+    engine.dispose()
+    with engine.connect():
+        pass
     
-    if _retry_connection(engine):
-        st.session_state.engine = engine
-        st.sidebar.success("🔄 Connection restored")
-        return True
-    return False
\ No newline at end of file
+    st.success("🔄 Connection restored")
+    return True
\ No newline at end of file
@@ -7,7 +7,6 @@ def initialize_session_state():
     """Initialize all session state variables"""
     session_vars = {
         'connected': False,
-        'engine': None,
         'available_schemas': [],
         'connection_params': {},
         'erd_generated': False,
@@ -21,5 +20,4 @@ def initialize_session_state():
     }
     
     for var, default_value in session_vars.items():
-        if var not in st.session_state:
-            st.session_state[var] = default_value
\ No newline at end of file
+        st.session_state.setdefault(var, default_value)
\ No newline at end of file
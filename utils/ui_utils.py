@@ -0,0 +1,14 @@
+"""Shared UI helpers"""
+
+from contextlib import contextmanager
+
+import streamlit as st
+
+
+@contextmanager
+def lazy_expander(label, key):
+    """Collapsed expander that yields True only once the user opts to load its body"""
+    # Streamlit serializes expander contents even while collapsed, so heavy
+    # tables are gated behind a toggle and skipped until requested
+    with st.expander(label, expanded=False):
+        yield st.toggle("Load", key=key)